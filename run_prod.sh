@@ -0,0 +1,17 @@
+#!/usr/bin/env bash
+# Serve the web interface with gunicorn and a gevent worker.
+#
+# The Flask development server handles one streaming chat at a time. A gevent
+# worker yields while each request waits on Ollama, so a single process can
+# keep many /api/chat streams open concurrently. The worker monkey-patches the
+# standard library itself, so no changes to src/app.py are needed.
+set -euo pipefail
+
+cd "$(dirname "$0")"
+
+exec gunicorn \
+    --worker-class gevent \
+    --workers 1 \
+    --worker-connections 1000 \
+    --bind "0.0.0.0:${PORT:-5000}" \
+    src.app:app
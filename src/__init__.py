@@ -6,7 +6,7 @@ A local Stata code editor and assistant bot powered by Llama 3.2
 __version__ = "0.1.0"
 __author__ = "Stata Llama Editor Contributors"
 
-from .llama_client import LlamaClient
+from .llama_client import LlamaClient, load_config
 from .stata_helper import StataHelper
 
-__all__ = ["LlamaClient", "StataHelper"]
+__all__ = ["LlamaClient", "StataHelper", "load_config"]
@@ -5,23 +5,105 @@ Flask web server for the Stata code assistant
 """
 
 from flask import Flask, render_template, request, Response, jsonify
-import sys
-from pathlib import Path
-import json
+from flask.json.provider import JSONProvider
+import threading
+import time
+from typing import Optional
+import orjson
 
-# Add src to path for imports
-sys.path.insert(0, str(Path(__file__).parent))
+from .llama_client import LlamaClient
+from .stata_helper import StataHelper
+
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson for request and response bodies"""
+    
+    def dumps(self, obj, **kwargs) -> str:
+        """Serialize to a JSON string, sorting keys like Flask's default"""
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS).decode()
+    
+    def loads(self, s, **kwargs):
+        """Parse a JSON string or bytes"""
+        return orjson.loads(s)
 
-from llama_client import LlamaClient
-from stata_helper import StataHelper
 
 app = Flask(__name__, 
             template_folder='../templates',
             static_folder='../static')
+app.json = OrjsonProvider(app)
+
+
+# Shared components, built on first use under a lock so concurrent first
+# requests (gevent workers or the threaded dev server) construct them once
+_init_lock = threading.Lock()
+_llama_client: Optional[LlamaClient] = None
+_stata_helper: Optional[StataHelper] = None
+
+
+def get_llama_client() -> LlamaClient:
+    """Create the shared LlamaClient on first use"""
+    global _llama_client
+    if _llama_client is None:
+        with _init_lock:
+            if _llama_client is None:
+                _llama_client = LlamaClient()
+    return _llama_client
+
+
+def get_stata_helper() -> StataHelper:
+    """Create the shared StataHelper on first use"""
+    global _stata_helper
+    if _stata_helper is None:
+        with _init_lock:
+            if _stata_helper is None:
+                _stata_helper = StataHelper()
+    return _stata_helper
 
-# Initialize clients
-llama_client = LlamaClient()
-stata_helper = StataHelper()
+
+# Pre-encoded Server-Sent Events framing
+SSE_PREFIX = b'data: '
+SSE_SUFFIX = b'\n\n'
+SSE_DONE = b'data: {"done":true}\n\n'
+
+# Coalesce token bursts: flush after this many chunks or this many seconds
+SSE_FLUSH_CHUNKS = 8
+SSE_FLUSH_INTERVAL = 0.02
+
+
+def sse_event(payload: dict) -> bytes:
+    """Encode a payload as a single SSE data frame"""
+    return SSE_PREFIX + orjson.dumps(payload) + SSE_SUFFIX
+
+
+def stream_response(prompt: str):
+    """
+    Stream the model response, batching closely spaced chunks per frame
+    
+    Frames are yielded as bytes, so responses can use direct_passthrough and
+    skip Werkzeug's per-item encoding wrapper.
+    """
+    buffer = []
+    last_flush = time.monotonic()
+    
+    try:
+        for chunk in get_llama_client().stream_generate(prompt):
+            buffer.append(chunk)
+            now = time.monotonic()
+            if len(buffer) >= SSE_FLUSH_CHUNKS or now - last_flush > SSE_FLUSH_INTERVAL:
+                yield sse_event({'content': ''.join(buffer)})
+                buffer.clear()
+                last_flush = now
+        
+        if buffer:
+            yield sse_event({'content': ''.join(buffer)})
+        
+        # Signal completion
+        yield SSE_DONE
+        
+    except Exception as e:
+        if buffer:
+            yield sse_event({'content': ''.join(buffer)})
+        yield sse_event({'error': str(e)})
 
 
 @app.route('/')
@@ -40,22 +122,10 @@ def chat():
         return jsonify({'error': 'No message provided'}), 400
     
     # Enhance prompt with Stata context
-    enhanced_prompt = stata_helper.enhance_prompt(user_message)
+    enhanced_prompt = get_stata_helper().enhance_prompt(user_message)
     
-    def generate():
-        """Stream the response"""
-        try:
-            for chunk in llama_client.stream_generate(enhanced_prompt):
-                # Send each chunk as JSON
-                yield f"data: {json.dumps({'content': chunk})}\n\n"
-            
-            # Signal completion
-            yield f"data: {json.dumps({'done': True})}\n\n"
-            
-        except Exception as e:
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
-    
-    return Response(generate(), mimetype='text/event-stream')
+    return Response(stream_response(enhanced_prompt), mimetype='text/event-stream',
+                    direct_passthrough=True)
 
 
 @app.route('/api/commands/<command>', methods=['POST'])
@@ -79,23 +149,14 @@ def handle_command(command):
     
     prompt = prompts[command]
     
-    def generate():
-        """Stream the response"""
-        try:
-            for chunk in llama_client.stream_generate(prompt):
-                yield f"data: {json.dumps({'content': chunk})}\n\n"
-            
-            yield f"data: {json.dumps({'done': True})}\n\n"
-            
-        except Exception as e:
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
-    
-    return Response(generate(), mimetype='text/event-stream')
+    return Response(stream_response(prompt), mimetype='text/event-stream',
+                    direct_passthrough=True)
 
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Check if the service is running"""
+    llama_client = get_llama_client()
     return jsonify({
         'status': 'healthy',
         'model': llama_client.model_name,
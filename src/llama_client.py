@@ -4,8 +4,61 @@ Handles interaction with the Llama 3.2 model via Ollama
 """
 
 import os
-from typing import Optional, Dict, Any
-import yaml
+from functools import lru_cache
+from typing import Optional, Dict, Any, List
+
+
+def load_config(config_path: str = "config.yaml") -> Dict[str, Any]:
+    """
+    Load configuration from YAML file
+    
+    Parsed files are cached by path and modification time, so every
+    component can call this without re-parsing, and editing the file
+    invalidates the cached copy.
+    
+    Args:
+        config_path: Path to the YAML configuration file
+        
+    Returns:
+        Configuration dictionary (shared; treat as read-only)
+    """
+    try:
+        return _parse_config(config_path, os.path.getmtime(config_path))
+    except FileNotFoundError:
+        # Return default config if file doesn't exist
+        return {
+            'model': {
+                'name': 'llama3.2',
+                'host': 'http://localhost:11434',
+                'temperature': 0.7,
+                'max_tokens': 2048,
+                'top_p': 0.9
+            }
+        }
+
+
+@lru_cache(maxsize=8)
+def _parse_config(config_path: str, mtime: float) -> Dict[str, Any]:
+    """Parse a YAML config file; mtime is only part of the cache key"""
+    import yaml
+    
+    with open(config_path, 'r') as f:
+        return yaml.safe_load(f)
+
+
+# Keyword arguments accepted by generate() and their Ollama option names
+OPTION_KWARGS = {
+    'temperature': 'temperature',
+    'max_tokens': 'num_predict',
+    'top_p': 'top_p',
+}
+
+
+# Ollama runtime options that can be set under 'model' in config.yaml
+RUNTIME_OPTIONS = ('num_thread', 'num_batch', 'num_gpu', 'use_mmap', 'use_mlock')
+
+# (host, model) pairs already checked against Ollama in this process
+_VERIFIED_MODELS = set()
 
 
 class LlamaClient:
@@ -16,47 +69,61 @@ class LlamaClient:
         self.config = self._load_config(config_path)
         self.model_name = self.config.get('model', {}).get('name', 'llama3.2')
         self.ollama_host = self.config.get('model', {}).get('host', 'http://localhost:11434')
+        self.keep_alive = self.config.get('model', {}).get('keep_alive')
+        
+        # The system message is fixed, so build its chat message once
+        system_message = self.config.get('prompts', {}).get('system_message', '')
+        self._system_messages = (
+            [{'role': 'system', 'content': system_message}] if system_message else []
+        )
+        
+        # Default generation options, merged with per-call overrides
+        model_config = self.config.get('model', {})
+        self._default_options = {
+            'temperature': model_config.get('temperature', 0.7),
+            'num_predict': model_config.get('max_tokens', 2048),
+            'top_p': model_config.get('top_p', 0.9),
+        }
+        
+        # Add stop sequences if provided
+        stop_sequences = model_config.get('stop_sequences', [])
+        if stop_sequences:
+            self._default_options['stop'] = stop_sequences
+        
+        # Pass through runtime tuning only when configured, so Ollama's own
+        # hardware detection stays in charge otherwise
+        for option in RUNTIME_OPTIONS:
+            if model_config.get(option) is not None:
+                self._default_options[option] = model_config[option]
+        
         self._initialize_ollama()
     
     def _load_config(self, config_path: str) -> Dict[str, Any]:
         """Load configuration from YAML file"""
-        try:
-            with open(config_path, 'r') as f:
-                return yaml.safe_load(f)
-        except FileNotFoundError:
-            # Return default config if file doesn't exist
-            return {
-                'model': {
-                    'name': 'llama3.2',
-                    'host': 'http://localhost:11434',
-                    'temperature': 0.7,
-                    'max_tokens': 2048,
-                    'top_p': 0.9
-                }
-            }
+        return load_config(config_path)
     
     def _initialize_ollama(self):
         """Initialize connection to Ollama"""
         try:
+            import httpx
             import ollama
-            self.client = ollama.Client(host=self.ollama_host)
             
-            # Test connection by listing models
-            try:
-                models_response = self.client.list()
-                if hasattr(models_response, 'models'):
-                    model_names = [model.model for model in models_response.models]
-                else:
-                    model_names = []
-                
-                # Check if requested model is available
-                if model_names and not any(self.model_name in name for name in model_names):
-                    print(f"Warning: Model '{self.model_name}' not found in Ollama.")
-                    print(f"Available models: {', '.join(model_names)}")
-                    print(f"Run: ollama pull {self.model_name}")
-            except Exception as e:
-                # Silently ignore - model verification is optional
-                pass
+            # Keep connections to Ollama alive between chats so each request
+            # reuses an open socket instead of paying a new TCP handshake.
+            # Concurrent chats each hold a connection, letting Ollama batch
+            # them server-side (see OLLAMA_NUM_PARALLEL).
+            max_connections = self.config.get('model', {}).get('max_connections', 8)
+            self.client = ollama.Client(
+                host=self.ollama_host,
+                timeout=None,
+                limits=httpx.Limits(
+                    max_keepalive_connections=max_connections,
+                    keepalive_expiry=300.0
+                )
+            )
+            
+            if not self.config.get('model', {}).get('skip_model_check', False):
+                self._verify_model()
                 
         except ImportError:
             raise ImportError(
@@ -69,6 +136,47 @@ class LlamaClient:
                 f"Make sure Ollama is running. Error: {str(e)}"
             )
     
+    def _verify_model(self):
+        """Warn if the configured model is not available in Ollama"""
+        # Each host/model pair only needs checking once per process
+        key = (self.ollama_host, self.model_name)
+        if key in _VERIFIED_MODELS:
+            return
+        
+        # Test connection by listing models
+        try:
+            models_response = self.client.list()
+            if hasattr(models_response, 'models'):
+                model_names = [model.model for model in models_response.models]
+            else:
+                model_names = []
+            
+            # Check if requested model is available
+            if model_names and not any(self.model_name in name for name in model_names):
+                print(f"Warning: Model '{self.model_name}' not found in Ollama.")
+                print(f"Available models: {', '.join(model_names)}")
+                print(f"Run: ollama pull {self.model_name}")
+            
+            _VERIFIED_MODELS.add(key)
+        except Exception as e:
+            # Silently ignore - model verification is optional
+            pass
+    
+    def _build_messages(self, prompt: str) -> List[Dict[str, str]]:
+        """Append the user turn to the cached system message"""
+        return self._system_messages + [{'role': 'user', 'content': prompt}]
+    
+    def _build_options(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """Merge per-call overrides into the default generation options"""
+        overrides = {
+            OPTION_KWARGS[key]: value
+            for key, value in kwargs.items() if key in OPTION_KWARGS
+        }
+        # Always hand out a copy so callers and ollama never share the defaults
+        if not overrides:
+            return dict(self._default_options)
+        return {**self._default_options, **overrides}
+    
     def generate(self, prompt: str, **kwargs) -> str:
         """
         Generate a response from the model
@@ -80,34 +188,15 @@ class LlamaClient:
         Returns:
             Generated text response
         """
-        model_config = self.config.get('model', {})
-        
-        # Get system message
-        system_message = self.config.get('prompts', {}).get('system_message', '')
+        # Nothing to answer, so skip the round trip to Ollama
+        if not prompt or not prompt.strip():
+            return ""
         
         # Build messages
-        messages = []
-        if system_message:
-            messages.append({
-                'role': 'system',
-                'content': system_message
-            })
-        messages.append({
-            'role': 'user',
-            'content': prompt
-        })
+        messages = self._build_messages(prompt)
         
         # Merge default config with kwargs
-        options = {
-            'temperature': kwargs.get('temperature', model_config.get('temperature', 0.7)),
-            'num_predict': kwargs.get('max_tokens', model_config.get('max_tokens', 2048)),
-            'top_p': kwargs.get('top_p', model_config.get('top_p', 0.9)),
-        }
-        
-        # Add stop sequences if provided
-        stop_sequences = model_config.get('stop_sequences', [])
-        if stop_sequences:
-            options['stop'] = stop_sequences
+        options = self._build_options(kwargs)
         
         try:
             # Generate response
@@ -115,7 +204,8 @@ class LlamaClient:
                 model=self.model_name,
                 messages=messages,
                 options=options,
-                stream=False
+                stream=False,
+                keep_alive=self.keep_alive
             )
             
             return response['message']['content'].strip()
@@ -134,29 +224,14 @@ class LlamaClient:
         Yields:
             Chunks of generated text
         """
-        model_config = self.config.get('model', {})
-        
-        # Get system message
-        system_message = self.config.get('prompts', {}).get('system_message', '')
+        if not prompt or not prompt.strip():
+            return
         
         # Build messages
-        messages = []
-        if system_message:
-            messages.append({
-                'role': 'system',
-                'content': system_message
-            })
-        messages.append({
-            'role': 'user',
-            'content': prompt
-        })
+        messages = self._build_messages(prompt)
         
         # Merge default config with kwargs
-        options = {
-            'temperature': kwargs.get('temperature', model_config.get('temperature', 0.7)),
-            'num_predict': kwargs.get('max_tokens', model_config.get('max_tokens', 2048)),
-            'top_p': kwargs.get('top_p', model_config.get('top_p', 0.9)),
-        }
+        options = self._build_options(kwargs)
         
         try:
             # Generate streaming response
@@ -164,7 +239,8 @@ class LlamaClient:
                 model=self.model_name,
                 messages=messages,
                 options=options,
-                stream=True
+                stream=True,
+                keep_alive=self.keep_alive
             )
             
             for chunk in stream:
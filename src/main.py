@@ -5,26 +5,24 @@ A local Stata code editor and assistant bot powered by Llama 3.2
 """
 
 import sys
-import os
-from pathlib import Path
+import time
 from typing import Optional
 
 import click
-from prompt_toolkit import PromptSession
-from prompt_toolkit.history import FileHistory
 from rich.console import Console
+from rich.live import Live
 from rich.markdown import Markdown
 from rich.panel import Panel
 
-# Add src to path for imports
-sys.path.insert(0, str(Path(__file__).parent))
-
-from llama_client import LlamaClient
-from stata_helper import StataHelper
+from .llama_client import LlamaClient
+from .stata_helper import StataHelper
 
 
 console = Console()
 
+# How often the streaming response panel is redrawn
+LIVE_REFRESH_PER_SECOND = 10
+
 
 class StataLlamaEditor:
     """Main application class for Stata Llama Editor"""
@@ -34,6 +32,10 @@ class StataLlamaEditor:
         self.config_path = config_path or "config.yaml"
         self.llama_client = LlamaClient(self.config_path)
         self.stata_helper = StataHelper()
+        
+        # prompt_toolkit is only needed for the interactive loop
+        from prompt_toolkit import PromptSession
+        from prompt_toolkit.history import FileHistory
         self.session = PromptSession(
             history=FileHistory('.stata_llama_history')
         )
@@ -111,13 +113,23 @@ Type your Stata code or questions to get started!
             # Add Stata context to the query
             enhanced_query = self.stata_helper.enhance_prompt(query)
             
-            # Get response from Llama
-            with console.status("[bold green]Thinking...[/bold green]"):
-                response = self.llama_client.generate(enhanced_query)
-            
-            # Display response
+            # Stream the response, re-rendering the Markdown as tokens arrive
             console.print("\n[bold cyan]Response:[/bold cyan]")
-            console.print(Panel(Markdown(response)))
+            chunks = []
+            with Live(Panel(Markdown("")), console=console,
+                      refresh_per_second=LIVE_REFRESH_PER_SECOND) as live:
+                last_render = time.monotonic()
+                for chunk in self.llama_client.stream_generate(enhanced_query):
+                    chunks.append(chunk)
+                    
+                    # Re-parsing Markdown per token is quadratic, so only
+                    # rebuild it as often as the screen refreshes
+                    now = time.monotonic()
+                    if now - last_render >= 1 / LIVE_REFRESH_PER_SECOND:
+                        live.update(Panel(Markdown("".join(chunks))))
+                        last_render = now
+                
+                live.update(Panel(Markdown("".join(chunks).strip())))
             console.print()
             
             return True
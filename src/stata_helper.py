@@ -3,10 +3,72 @@ Stata Helper Module
 Provides utilities for Stata code analysis and prompt enhancement
 """
 
+from functools import lru_cache
 from typing import List, Dict, Optional
 import re
 
 
+# Commands that open an indented block in format_code
+LOOP_KEYWORDS = ('foreach', 'forvalues')
+
+
+# Static context prepended to every prompt. Keeping it byte-identical across
+# requests lets the model server reuse its cached KV state for this prefix.
+STATA_CONTEXT = """
+You are a Stata programming assistant. Stata is a statistical software package 
+used for data analysis, data management, and graphics. When helping with Stata code:
+
+1. Use proper Stata syntax and conventions
+2. Consider data management best practices
+3. Be aware of common Stata commands and their options
+4. Provide clear, efficient, and well-commented code
+5. Consider memory efficiency and performance
+6. Follow Stata's naming conventions (lowercase for variables and commands)
+7. Use appropriate data types and formats
+8. Consider using -preserve- and -restore- when making temporary changes
+""".strip()
+
+
+# Patterns that suggest a prompt contains Stata code. They are compiled once
+# into a single alternation so detection scans the text in one pass.
+CODE_PATTERN = re.compile(
+    "|".join(f"(?:{pattern})" for pattern in [
+        r'\bregress\b',
+        r'\bsummarize\b',
+        r'\bgenerate\b',
+        r'\btabulate\b',
+        r'\bforeach\b',
+        r'\bforvalues\b',
+        r'\bif\b.*\bthen\b',
+        r'\bdi\b|\bdisplay\b',
+        r'[a-z_]+\s*=\s*',  # Variable assignment
+        r'\*\s*[A-Za-z]',  # Comments
+    ]),
+    re.IGNORECASE
+)
+
+
+# Markdown fences and inline code in a single pattern; at a fence the first
+# branch consumes it, so inline matches never split a fence
+CODE_BLOCK_PATTERN = re.compile(
+    r'```(?:stata|do)?\n(?P<block>.*?)```|`(?P<inline>[^`]+)`',
+    re.DOTALL
+)
+
+
+# A Stata compound-quoted string that contains no other compound quote
+COMPOUND_QUOTE_PATTERN = re.compile(r'`"(?:(?!`").)*?"\'')
+
+
+@lru_cache(maxsize=256)
+def _enhance(context: str, prompt: str) -> str:
+    """Prepend the Stata context, flagging prompts that contain code"""
+    # Cached at module level so every StataHelper shares the results
+    if CODE_PATTERN.search(prompt) is not None:
+        return f"{context}\n\nHere is the Stata code to analyze:\n\n{prompt}"
+    return f"{context}\n\n{prompt}"
+
+
 class StataHelper:
     """Helper class for Stata-specific operations"""
     
@@ -14,6 +76,9 @@ class StataHelper:
         """Initialize Stata helper with common commands and patterns"""
         self.common_commands = self._load_common_commands()
         self.stata_context = self._load_stata_context()
+        
+        # Indentation strings reused by format_code
+        self._indents = tuple('    ' * level for level in range(64))
     
     def _load_common_commands(self) -> Dict[str, str]:
         """Load common Stata commands and their descriptions"""
@@ -38,19 +103,7 @@ class StataHelper:
     
     def _load_stata_context(self) -> str:
         """Load Stata programming context for prompts"""
-        return """
-You are a Stata programming assistant. Stata is a statistical software package 
-used for data analysis, data management, and graphics. When helping with Stata code:
-
-1. Use proper Stata syntax and conventions
-2. Consider data management best practices
-3. Be aware of common Stata commands and their options
-4. Provide clear, efficient, and well-commented code
-5. Consider memory efficiency and performance
-6. Follow Stata's naming conventions (lowercase for variables and commands)
-7. Use appropriate data types and formats
-8. Consider using -preserve- and -restore- when making temporary changes
-        """.strip()
+        return STATA_CONTEXT
     
     def enhance_prompt(self, user_prompt: str) -> str:
         """
@@ -62,37 +115,11 @@ used for data analysis, data management, and graphics. When helping with Stata c
         Returns:
             Enhanced prompt with Stata context
         """
-        # Add Stata context to prompt
-        enhanced = f"{self.stata_context}\n\n"
-        
-        # Detect if code is present
-        if self._contains_code(user_prompt):
-            enhanced += "Here is the Stata code to analyze:\n\n"
-        
-        enhanced += user_prompt
-        
-        return enhanced
+        return _enhance(self.stata_context, user_prompt)
     
     def _contains_code(self, text: str) -> bool:
         """Check if text contains Stata code"""
-        # Look for common Stata patterns
-        stata_patterns = [
-            r'\bregress\b',
-            r'\bsummarize\b',
-            r'\bgenerate\b',
-            r'\btabulate\b',
-            r'\bforeach\b',
-            r'\bforvalues\b',
-            r'\bif\b.*\bthen\b',
-            r'\bdi\b|\bdisplay\b',
-            r'[a-z_]+\s*=\s*',  # Variable assignment
-            r'\*\s*[A-Za-z]',  # Comments
-        ]
-        
-        for pattern in stata_patterns:
-            if re.search(pattern, text, re.IGNORECASE):
-                return True
-        return False
+        return CODE_PATTERN.search(text) is not None
     
     def extract_code_blocks(self, text: str) -> List[str]:
         """
@@ -104,18 +131,14 @@ used for data analysis, data management, and graphics. When helping with Stata c
         Returns:
             List of extracted code blocks
         """
-        # Look for code in backticks or indented blocks
+        # One pass over the text for both markdown blocks and inline code
         code_blocks = []
+        for match in CODE_BLOCK_PATTERN.finditer(text):
+            block = match.group(match.lastgroup).strip()
+            if block:
+                code_blocks.append(block)
         
-        # Markdown code blocks
-        markdown_pattern = r'```(?:stata|do)?\n(.*?)```'
-        code_blocks.extend(re.findall(markdown_pattern, text, re.DOTALL))
-        
-        # Inline code
-        inline_pattern = r'`([^`]+)`'
-        code_blocks.extend(re.findall(inline_pattern, text))
-        
-        return [block.strip() for block in code_blocks if block.strip()]
+        return code_blocks
     
     def format_code(self, code: str) -> str:
         """
@@ -127,25 +150,30 @@ used for data analysis, data management, and graphics. When helping with Stata c
         Returns:
             Formatted code
         """
-        lines = code.split('\n')
+        indents = self._indents
+        max_level = len(indents) - 1
         formatted_lines = []
         indent_level = 0
         
-        for line in lines:
+        for line in code.split('\n'):
             stripped = line.strip()
             
+            if not stripped:
+                formatted_lines.append('')
+                continue
+            
             # Decrease indent for closing braces
-            if stripped.startswith('}'):
+            if stripped[0] == '}':
                 indent_level = max(0, indent_level - 1)
             
             # Add indentation
-            if stripped:
-                formatted_lines.append('    ' * indent_level + stripped)
+            if indent_level <= max_level:
+                formatted_lines.append(indents[indent_level] + stripped)
             else:
-                formatted_lines.append('')
+                formatted_lines.append('    ' * indent_level + stripped)
             
             # Increase indent for opening braces or foreach/forvalues
-            if stripped.endswith('{') or stripped.startswith(('foreach', 'forvalues')):
+            if stripped[-1] == '{' or stripped.startswith(LOOP_KEYWORDS):
                 indent_level += 1
         
         return '\n'.join(formatted_lines)
@@ -169,16 +197,28 @@ used for data analysis, data management, and graphics. When helping with Stata c
                 open_braces, close_braces
             )
         
+        # Quote checks are per line, so only split when quotes are present
+        if '"' not in code and "'" not in code and '`' not in code:
+            return True, None
+        
         # Check for common syntax errors
-        lines = code.split('\n')
-        for i, line in enumerate(lines, 1):
-            stripped = line.strip()
+        for i, line in enumerate(code.split('\n'), 1):
+            # Compound quotes (`"..."') may hold any quote characters, so
+            # drop them before counting, innermost first when nested
+            while '`"' in line:
+                stripped = COMPOUND_QUOTE_PATTERN.sub('', line)
+                if stripped == line:
+                    break
+                line = stripped
             
-            # Check for unclosed quotes
-            if stripped.count('"') % 2 != 0:
+            # Check for unclosed quotes (surrounding whitespace never
+            # changes the counts, so the line is not stripped)
+            if line.count('"') % 2 != 0:
                 return False, f"Unclosed quote on line {i}"
             
-            if stripped.count("'") % 2 != 0:
+            # Stata macro references (`name') close with an apostrophe, so
+            # only apostrophes beyond the backticks are string quotes
+            if (line.count("'") - line.count('`')) % 2 != 0:
                 return False, f"Unclosed quote on line {i}"
         
         return True, None
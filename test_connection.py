@@ -12,4 +12,4 @@ response = client.generate("Say 'hello' in one word.")
 print(f"✓ Response received: {response}")
 
 print("\n✅ All tests passed! Your Stata Llama Editor is ready to use.")
-print("\nRun the application with: python src/main.py")
+print("\nRun the application with: python -m src.main")
@@ -0,0 +1,108 @@
+"""
+Shared pytest fixtures for the Stata Editor tests
+"""
+
+import socket
+from urllib.parse import urlsplit
+
+import pytest
+
+from llama_client import LlamaClient, load_config
+from stata_helper import StataHelper
+
+
+@pytest.fixture(scope="session")
+def llama_client_cls():
+    """LlamaClient class, imported once for the whole session"""
+    return LlamaClient
+
+
+@pytest.fixture(scope="session")
+def stata_helper_cls():
+    """StataHelper class, imported once for the whole session"""
+    return StataHelper
+
+
+@pytest.fixture(scope="session")
+def client(llama_client_cls):
+    """Shared LlamaClient, so the Ollama connection is set up once"""
+    return llama_client_cls()
+
+
+@pytest.fixture(scope="session")
+def warm_client(client):
+    """Shared client whose model has been loaded by a one-token request"""
+    client.generate("hi", max_tokens=1)
+    return client
+
+
+@pytest.fixture(scope="session")
+def helper(stata_helper_cls):
+    """Shared StataHelper; the tests only read from it"""
+    return stata_helper_cls()
+
+
+# Canned model output used by the mocked Ollama client
+FAKE_RESPONSE = "The regress command fits a linear regression of y on x."
+
+
+def fake_chat(self, model, messages, options=None, stream=False, **kwargs):
+    """Stand-in for ollama.Client.chat that answers without a server"""
+    if stream:
+        return iter(
+            {'message': {'content': word + ' '}}
+            for word in FAKE_RESPONSE.split()
+        )
+    return {'message': {'content': FAKE_RESPONSE}}
+
+
+@pytest.fixture
+def mock_chat(monkeypatch):
+    """Route LlamaClient chat calls to a fake instead of a live Ollama server"""
+    monkeypatch.setattr('ollama.Client.chat', fake_chat)
+    return FAKE_RESPONSE
+
+
+def _ollama_reachable(host: str, timeout: float = 0.5) -> bool:
+    """Check whether anything is listening at the Ollama host URL"""
+    url = urlsplit(host if '://' in host else f'http://{host}')
+    try:
+        with socket.create_connection((url.hostname, url.port or 11434), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+def pytest_addoption(parser):
+    """Add the --bench switch for performance regression tests"""
+    parser.addoption(
+        '--bench', action='store_true', default=False,
+        help="run tests marked 'benchmark' (needs pytest-benchmark)"
+    )
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_collection_modifyitems(config, items):
+    """Skip benchmarks unless asked, and integration tests without Ollama
+    
+    Runs last so ``items`` holds only what survived ``-m`` deselection, and
+    the Ollama probe is skipped when no integration test will run.
+    """
+    if not config.getoption('--bench'):
+        skip_bench = pytest.mark.skip(reason="benchmarks only run with --bench")
+        for item in items:
+            if 'benchmark' in item.keywords:
+                item.add_marker(skip_bench)
+    
+    integration_items = [item for item in items if 'integration' in item.keywords]
+    if not integration_items:
+        return
+    
+    model_config = load_config(str(config.rootpath / 'config.yaml')).get('model', {})
+    host = model_config.get('host', 'http://localhost:11434')
+    if _ollama_reachable(host):
+        return
+    
+    skip = pytest.mark.skip(reason=f"Ollama is not reachable at {host}")
+    for item in integration_items:
+        item.add_marker(skip)
@@ -2,20 +2,33 @@
 Run all tests and generate comprehensive report
 """
 
+import argparse
 import sys
 from pathlib import Path
+import statistics
 import time
-import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 
 # Add src to path
 sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
 
-from test_evaluation import StataEvaluator
+from test_evaluation import StataEvaluator, write_json
 from test_performance import PerformanceBenchmark
 
 
 def main():
     """Run all test suites"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--cache-responses', action='store_true',
+                        help='Reuse identical benchmark responses (latency stays uncached)')
+    parser.add_argument('--dump-responses', action='store_true',
+                        help='Keep full evaluation responses in the results file')
+    parser.add_argument('--eval-workers', type=int, default=1,
+                        help='Concurrent evaluation prompts (response times then '
+                             'include server queueing; default: 1)')
+    args = parser.parse_args()
+    
     print("╔═══════════════════════════════════════════════════════════════════╗")
     print("║         STATA LLAMA EDITOR - COMPREHENSIVE TEST SUITE             ║")
     print("╚═══════════════════════════════════════════════════════════════════╝")
@@ -34,7 +47,8 @@ def main():
         print("\n" + "█" * 70)
         print("PART 1: EVALUATION TESTS")
         print("█" * 70)
-        evaluator = StataEvaluator()
+        evaluator = StataEvaluator(max_workers=args.eval_workers,
+                                   store_responses=args.dump_responses)
         eval_results = evaluator.evaluate_all()
         all_results['evaluation'] = eval_results
     except Exception as e:
@@ -46,7 +60,7 @@ def main():
         print("\n\n" + "█" * 70)
         print("PART 2: PERFORMANCE BENCHMARKS")
         print("█" * 70)
-        benchmark = PerformanceBenchmark()
+        benchmark = PerformanceBenchmark(cache_responses=args.cache_responses)
         perf_results = benchmark.run_all_benchmarks()
         all_results['performance'] = perf_results
     except Exception as e:
@@ -58,49 +72,89 @@ def main():
     print("║" + " " * 20 + "FINAL REPORT" + " " * 36 + "║")
     print("╚" + "═" * 68 + "╝")
     
-    generate_report(all_results)
+    summary = _summarize(all_results)
+    all_results['summary'] = summary
     
-    # Save comprehensive results
+    # Save comprehensive results in the background while the report prints;
+    # the report only reads all_results, so they can overlap safely
     save_timestamp = time.strftime('%Y%m%d_%H%M%S')
     filepath = f"comprehensive_test_results_{save_timestamp}.json"
-    with open(filepath, 'w') as f:
-        json.dump(all_results, f, indent=2)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        write_future = executor.submit(write_json, filepath, all_results)
+        
+        generate_report(all_results, summary)
+        
+        # Surface any write error here
+        write_future.result()
     
     print(f"\n💾 Complete results saved to: {filepath}")
     print(f"\n🕐 Completed: {time.strftime('%Y-%m-%d %H:%M:%S')}")
 
 
-def generate_report(results: dict):
-    """Generate final summary report"""
+def _summarize(results: dict) -> dict:
+    """Compute the pass rates and performance figures the report needs, once"""
+    summary = {
+        'evaluation_ok': False,
+        'performance_ok': False,
+    }
+    
+    eval_data = results.get('evaluation')
+    if eval_data and 'error' not in eval_data:
+        summary['evaluation_ok'] = True
+        summary['tests_passed'] = eval_data['total_passed']
+        summary['tests_total'] = eval_data['total_tests']
+        summary['overall_pass_rate'] = (eval_data['total_passed'] / eval_data['total_tests'] * 100) if eval_data['total_tests'] > 0 else 0
+        summary['per_category_rates'] = {
+            category: (cat_data['passed'] / cat_data['total'] * 100) if cat_data['total'] > 0 else 0
+            for category, cat_data in eval_data.get('categories', {}).items()
+        }
+    
+    perf_data = results.get('performance')
+    if perf_data and 'error' not in perf_data:
+        summary['performance_ok'] = True
+        if 'latency' in perf_data:
+            summary['avg_latency'] = statistics.fmean(
+                m['avg'] for m in perf_data['latency'].values())
+        if 'throughput' in perf_data:
+            summary['throughput'] = perf_data['throughput']['tokens_per_second']
+        if 'streaming' in perf_data:
+            summary['time_to_first_chunk'] = perf_data['streaming']['time_to_first_chunk']
+    
+    return summary
+
+
+def generate_report(results: dict, summary: Optional[dict] = None) -> dict:
+    """Generate final summary report and return the computed summary"""
+    if summary is None:
+        summary = _summarize(results)
+    
     print("\n📋 EVALUATION SUMMARY:")
-    if 'evaluation' in results and 'error' not in results['evaluation']:
-        eval_data = results['evaluation']
-        pass_rate = (eval_data['total_passed'] / eval_data['total_tests'] * 100) if eval_data['total_tests'] > 0 else 0
+    if summary['evaluation_ok']:
+        pass_rate = summary['overall_pass_rate']
         print(f"   Overall Pass Rate: {pass_rate:.1f}%")
-        print(f"   Tests Passed: {eval_data['total_passed']}/{eval_data['total_tests']}")
+        print(f"   Tests Passed: {summary['tests_passed']}/{summary['tests_total']}")
         print(f"   Grade: {get_grade(pass_rate)}")
     else:
         print("   ❌ Evaluation failed to run")
     
     print("\n⚡ PERFORMANCE SUMMARY:")
-    if 'performance' in results and 'error' not in results['performance']:
-        perf_data = results['performance']
-        if 'latency' in perf_data:
-            avg_latencies = [m['avg'] for m in perf_data['latency'].values()]
-            overall_avg = sum(avg_latencies) / len(avg_latencies)
-            print(f"   Avg Response Time: {overall_avg:.2f}s")
-        if 'throughput' in perf_data:
-            print(f"   Throughput: {perf_data['throughput']['tokens_per_second']:.1f} tokens/sec")
-        if 'streaming' in perf_data:
-            print(f"   Time to First Chunk: {perf_data['streaming']['time_to_first_chunk']:.3f}s")
+    if summary['performance_ok']:
+        if 'avg_latency' in summary:
+            print(f"   Avg Response Time: {summary['avg_latency']:.2f}s")
+        if 'throughput' in summary:
+            print(f"   Throughput: {summary['throughput']:.1f} tokens/sec")
+        if 'time_to_first_chunk' in summary:
+            print(f"   Time to First Chunk: {summary['time_to_first_chunk']:.3f}s")
     else:
         print("   ❌ Performance benchmarks failed to run")
     
     print("\n💡 KEY FINDINGS:")
-    print_key_findings(results)
+    print_key_findings(summary)
     
     print("\n🎯 RECOMMENDATIONS:")
-    print_recommendations(results)
+    print_recommendations(summary)
+    
+    return summary
 
 
 def get_grade(pass_rate: float) -> str:
@@ -112,14 +166,13 @@ def get_grade(pass_rate: float) -> str:
     else: return "F (Poor)"
 
 
-def print_key_findings(results: dict):
+def print_key_findings(summary: dict):
     """Print key findings"""
     findings = []
     
     # Evaluation findings
-    if 'evaluation' in results and 'error' not in results['evaluation']:
-        eval_data = results['evaluation']
-        pass_rate = (eval_data['total_passed'] / eval_data['total_tests'] * 100) if eval_data['total_tests'] > 0 else 0
+    if summary['evaluation_ok']:
+        pass_rate = summary['overall_pass_rate']
         
         if pass_rate >= 80:
             findings.append("   ✅ Strong performance on Stata knowledge tests")
@@ -129,25 +182,20 @@ def print_key_findings(results: dict):
             findings.append("   ❌ Significant gaps in Stata knowledge")
         
         # Category-specific findings
-        if 'categories' in eval_data:
-            for category, cat_data in eval_data['categories'].items():
-                cat_rate = (cat_data['passed'] / cat_data['total'] * 100) if cat_data['total'] > 0 else 0
-                if cat_rate < 60:
-                    findings.append(f"   ⚠️  {category} needs significant improvement ({cat_rate:.0f}%)")
+        for category, cat_rate in summary['per_category_rates'].items():
+            if cat_rate < 60:
+                findings.append(f"   ⚠️  {category} needs significant improvement ({cat_rate:.0f}%)")
     
     # Performance findings
-    if 'performance' in results and 'error' not in results['performance']:
-        perf_data = results['performance']
-        if 'latency' in perf_data:
-            avg_latencies = [m['avg'] for m in perf_data['latency'].values()]
-            overall_avg = sum(avg_latencies) / len(avg_latencies)
-            
-            if overall_avg < 3:
-                findings.append("   ✅ Fast response times")
-            elif overall_avg < 6:
-                findings.append("   ⚠️  Moderate response times")
-            else:
-                findings.append("   ❌ Slow response times - consider optimization")
+    if 'avg_latency' in summary:
+        overall_avg = summary['avg_latency']
+        
+        if overall_avg < 3:
+            findings.append("   ✅ Fast response times")
+        elif overall_avg < 6:
+            findings.append("   ⚠️  Moderate response times")
+        else:
+            findings.append("   ❌ Slow response times - consider optimization")
     
     if findings:
         for finding in findings:
@@ -156,34 +204,23 @@ def print_key_findings(results: dict):
         print("   No key findings available")
 
 
-def print_recommendations(results: dict):
+def print_recommendations(summary: dict):
     """Print recommendations for improvement"""
     recommendations = []
     
     # Evaluation recommendations
-    if 'evaluation' in results and 'error' not in results['evaluation']:
-        eval_data = results['evaluation']
-        if 'categories' in eval_data:
-            for category, cat_data in eval_data['categories'].items():
-                cat_rate = (cat_data['passed'] / cat_data['total'] * 100) if cat_data['total'] > 0 else 0
-                if cat_rate < 70:
-                    recommendations.append(f"   • Improve {category} capabilities through targeted training")
+    if summary['evaluation_ok']:
+        for category, cat_rate in summary['per_category_rates'].items():
+            if cat_rate < 70:
+                recommendations.append(f"   • Improve {category} capabilities through targeted training")
     
     # Performance recommendations
-    if 'performance' in results and 'error' not in results['performance']:
-        perf_data = results['performance']
-        if 'latency' in perf_data:
-            avg_latencies = [m['avg'] for m in perf_data['latency'].values()]
-            overall_avg = sum(avg_latencies) / len(avg_latencies)
-            
-            if overall_avg > 5:
-                recommendations.append("   • Consider using a faster model or optimizing inference")
-                recommendations.append("   • Investigate caching frequently asked questions")
-        
-        if 'throughput' in perf_data:
-            tps = perf_data['throughput']['tokens_per_second']
-            if tps < 20:
-                recommendations.append("   • Low throughput - check hardware resources")
+    if 'avg_latency' in summary and summary['avg_latency'] > 5:
+        recommendations.append("   • Consider using a faster model or optimizing inference")
+        recommendations.append("   • Investigate caching frequently asked questions")
+    
+    if 'throughput' in summary and summary['throughput'] < 20:
+        recommendations.append("   • Low throughput - check hardware resources")
     
     if not recommendations:
         recommendations.append("   ✨ System is performing well! Continue monitoring.")
@@ -0,0 +1,38 @@
+"""
+Timings for StataHelper hot paths
+
+The precompiled-pattern guarantees themselves are checked deterministically
+in test_stata_helper.py; these benchmarks only report how fast the paths are.
+
+Run with: python -m pytest --bench tests/test_benchmarks.py
+"""
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+
+CODE_BLOCK_TEXT = """
+Here is some code:
+```stata
+regress y x
+```
+And inline: `summarize var`
+"""
+
+
+@pytest.mark.benchmark(group="stata_helper")
+@pytest.mark.parametrize("text,expected", [
+    ("regress y x1 x2", True),
+    # A miss tries every alternative, so it is the slow path
+    ("How do I analyze data?", False),
+])
+def test_contains_code_perf(benchmark, helper, text, expected):
+    """Time code detection on a match and a miss"""
+    assert benchmark(helper._contains_code, text) is expected
+
+
+@pytest.mark.benchmark(group="stata_helper")
+def test_extract_code_blocks_perf(benchmark, helper):
+    """Time code block extraction"""
+    assert len(benchmark(helper.extract_code_blocks, CODE_BLOCK_TEXT)) == 2
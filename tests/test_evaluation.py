@@ -3,11 +3,24 @@ Stata Editor Evaluation Suite
 Tests the AI's performance on Stata-specific tasks
 """
 
+import argparse
+import io
 import sys
 from pathlib import Path
 import time
 import json
-from typing import Dict, List, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import ClassVar, Dict, List, Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 
 # Add src to path
 sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
@@ -16,58 +29,67 @@ from llama_client import LlamaClient
 from stata_helper import StataHelper
 
 
-class StataEvaluator:
-    """Evaluates the Stata editor's performance on various tasks"""
+def write_json(filepath: str, data: Any):
+    """Write data as indented JSON, using orjson when it is installed"""
+    if orjson is not None:
+        payload = orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    else:
+        payload = json.dumps(data, indent=2).encode('utf-8')
     
-    def __init__(self):
-        self.client = LlamaClient()
-        self.helper = StataHelper()
-        self.results = []
-        
-    def evaluate_all(self) -> Dict[str, Any]:
-        """Run all evaluation tests"""
-        print("🧪 Starting Stata Editor Evaluation Suite\n")
-        print("=" * 70)
-        
-        categories = [
-            ("Basic Commands", self.test_basic_commands),
-            ("Code Explanation", self.test_code_explanation),
-            ("Debugging", self.test_debugging),
-            ("Optimization", self.test_optimization),
-            ("Best Practices", self.test_best_practices),
-            ("Edge Cases", self.test_edge_cases),
-        ]
-        
-        overall_results = {
-            'categories': {},
-            'total_tests': 0,
-            'total_passed': 0,
-            'avg_response_time': 0,
-            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
-        }
-        
-        total_time = 0
-        
-        for category_name, test_func in categories:
-            print(f"\n📋 Testing: {category_name}")
-            print("-" * 70)
-            
-            category_results = test_func()
-            overall_results['categories'][category_name] = category_results
-            overall_results['total_tests'] += category_results['total']
-            overall_results['total_passed'] += category_results['passed']
-            total_time += category_results['total_time']
-            
-            self._print_category_summary(category_results)
-        
-        overall_results['avg_response_time'] = total_time / overall_results['total_tests'] if overall_results['total_tests'] > 0 else 0
+    # Serialize up front so the file is written in one call
+    with open(filepath, 'wb') as f:
+        f.write(payload)
+
+
+def _prepare_test(test: Dict) -> Dict:
+    """Lowercase a test's keywords once, keeping the originals for reports"""
+    if 'expected_lc' not in test:
+        test['expected_lc'] = tuple(
+            (kw, kw.lower()) for kw in test['expected_keywords'])
+        test['forbidden_lc'] = tuple(
+            (kw, kw.lower()) for kw in test.get('forbidden_keywords', []))
         
-        self._print_overall_summary(overall_results)
-        return overall_results
+        # One automaton finds every keyword in a single pass over the response
+        if ahocorasick is not None:
+            automaton = ahocorasick.Automaton()
+            for _, kw_lower in test['expected_lc'] + test['forbidden_lc']:
+                automaton.add_word(kw_lower, kw_lower)
+            automaton.make_automaton()
+            test['automaton'] = automaton
+    return test
+
+
+def _prepare_suites(suites: Dict[str, List[Dict]]) -> Dict[str, List[Dict]]:
+    """Prepare every test in a mapping of category name to test list"""
+    for tests in suites.values():
+        for test in tests:
+            _prepare_test(test)
+    return suites
+
+
+class _BufferedLogger:
+    """Collects report lines and writes them to stdout in a single call"""
     
-    def test_basic_commands(self) -> Dict:
-        """Test understanding of basic Stata commands"""
-        tests = [
+    def __init__(self):
+        self._buffer = io.StringIO()
+    
+    def print(self, *args, **kwargs):
+        """Buffer a line with the same arguments as print()"""
+        print(*args, file=self._buffer, **kwargs)
+    
+    def flush(self):
+        """Write everything buffered so far and start a new buffer"""
+        sys.stdout.write(self._buffer.getvalue())
+        sys.stdout.flush()
+        self._buffer = io.StringIO()
+
+
+class StataEvaluator:
+    """Evaluates the Stata editor's performance on various tasks"""
+    
+    # Test suites are static, so they are defined and prepared once per process
+    _TESTS: ClassVar[Dict[str, List[Dict]]] = _prepare_suites({
+        'Basic Commands': [
             {
                 'name': 'Regression command',
                 'prompt': 'What does "regress mpg weight length" do in Stata?',
@@ -92,13 +114,8 @@ class StataEvaluator:
                 'expected_keywords': ['merge', 'combine', 'id', 'one-to-one', 'match'],
                 'forbidden_keywords': []
             },
-        ]
-        
-        return self._run_tests(tests)
-    
-    def test_code_explanation(self) -> Dict:
-        """Test ability to explain Stata code"""
-        tests = [
+        ],
+        'Code Explanation': [
             {
                 'name': 'Loop explanation',
                 'prompt': 'Explain this Stata code:\nforeach var of varlist price mpg weight {\n    summarize `var\'\n}',
@@ -117,13 +134,8 @@ class StataEvaluator:
                 'expected_keywords': ['group', 'sort', 'average', 'mean', 'company', 'year'],
                 'forbidden_keywords': []
             },
-        ]
-        
-        return self._run_tests(tests)
-    
-    def test_debugging(self) -> Dict:
-        """Test ability to identify and fix code issues"""
-        tests = [
+        ],
+        'Debugging': [
             {
                 'name': 'Missing variable issue',
                 'prompt': 'Debug this code: regress price mpg weigth (note: weigth is misspelled)',
@@ -142,13 +154,8 @@ class StataEvaluator:
                 'expected_keywords': ['missing', 'should', 'invalid', 'outlier', 'better'],
                 'forbidden_keywords': []
             },
-        ]
-        
-        return self._run_tests(tests)
-    
-    def test_optimization(self) -> Dict:
-        """Test ability to suggest optimizations"""
-        tests = [
+        ],
+        'Optimization': [
             {
                 'name': 'Inefficient loop',
                 'prompt': 'Optimize: foreach i of numlist 1/100 { generate var`i\' = 0 }',
@@ -161,13 +168,8 @@ class StataEvaluator:
                 'expected_keywords': ['redundant', 'unnecessary', 'single', 'once', 'remove'],
                 'forbidden_keywords': []
             },
-        ]
-        
-        return self._run_tests(tests)
-    
-    def test_best_practices(self) -> Dict:
-        """Test knowledge of Stata best practices"""
-        tests = [
+        ],
+        'Best Practices': [
             {
                 'name': 'Variable naming',
                 'prompt': 'Is "Price_2024" a good Stata variable name? Suggest improvements.',
@@ -186,13 +188,8 @@ class StataEvaluator:
                 'expected_keywords': ['check', 'missing', 'drop', 'impute', 'understand'],
                 'forbidden_keywords': []
             },
-        ]
-        
-        return self._run_tests(tests)
-    
-    def test_edge_cases(self) -> Dict:
-        """Test handling of edge cases and complex scenarios"""
-        tests = [
+        ],
+        'Edge Cases': [
             {
                 'name': 'Complex merge',
                 'prompt': 'How do I merge datasets with non-unique identifiers?',
@@ -205,9 +202,91 @@ class StataEvaluator:
                 'expected_keywords': ['xtset', 'panel', 'time', 'id', 'declare'],
                 'forbidden_keywords': []
             },
+        ],
+    })
+    
+    # Characters of each response kept in results unless store_responses is set
+    RESPONSE_PREVIEW_CHARS = 200
+    
+    def __init__(self, max_workers: int = 1, store_responses: bool = False):
+        self.client = LlamaClient()
+        self.helper = StataHelper()
+        self.results = []
+        # Prompts within a category are independent and may run concurrently,
+        # but then response times include queueing on the server, so the
+        # default of 1 keeps timings comparable between runs
+        self.max_workers = max_workers
+        # Full responses bloat results files; keep a preview unless asked
+        self.store_responses = store_responses
+        # Report lines are written out once per section
+        self._log = _BufferedLogger()
+        
+    def evaluate_all(self) -> Dict[str, Any]:
+        """Run all evaluation tests"""
+        self._log.print("🧪 Starting Stata Editor Evaluation Suite\n")
+        self._log.print("=" * 70)
+        
+        categories = [
+            ("Basic Commands", self.test_basic_commands),
+            ("Code Explanation", self.test_code_explanation),
+            ("Debugging", self.test_debugging),
+            ("Optimization", self.test_optimization),
+            ("Best Practices", self.test_best_practices),
+            ("Edge Cases", self.test_edge_cases),
         ]
         
-        return self._run_tests(tests)
+        overall_results = {
+            'categories': {},
+            'total_tests': 0,
+            'total_passed': 0,
+            'avg_response_time': 0,
+            'concurrency': self.max_workers,
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+        }
+        
+        total_time = 0
+        
+        for category_name, test_func in categories:
+            self._log.print(f"\n📋 Testing: {category_name}")
+            self._log.print("-" * 70)
+            self._log.flush()
+            
+            category_results = test_func()
+            overall_results['categories'][category_name] = category_results
+            overall_results['total_tests'] += category_results['total']
+            overall_results['total_passed'] += category_results['passed']
+            total_time += category_results['total_time']
+            
+            self._print_category_summary(category_results)
+        
+        overall_results['avg_response_time'] = total_time / overall_results['total_tests'] if overall_results['total_tests'] > 0 else 0
+        
+        self._print_overall_summary(overall_results)
+        return overall_results
+    
+    def test_basic_commands(self) -> Dict:
+        """Test understanding of basic Stata commands"""
+        return self._run_tests(self._TESTS['Basic Commands'])
+    
+    def test_code_explanation(self) -> Dict:
+        """Test ability to explain Stata code"""
+        return self._run_tests(self._TESTS['Code Explanation'])
+    
+    def test_debugging(self) -> Dict:
+        """Test ability to identify and fix code issues"""
+        return self._run_tests(self._TESTS['Debugging'])
+    
+    def test_optimization(self) -> Dict:
+        """Test ability to suggest optimizations"""
+        return self._run_tests(self._TESTS['Optimization'])
+    
+    def test_best_practices(self) -> Dict:
+        """Test knowledge of Stata best practices"""
+        return self._run_tests(self._TESTS['Best Practices'])
+    
+    def test_edge_cases(self) -> Dict:
+        """Test handling of edge cases and complex scenarios"""
+        return self._run_tests(self._TESTS['Edge Cases'])
     
     def _run_tests(self, tests: List[Dict]) -> Dict:
         """Run a list of tests and return results"""
@@ -220,45 +299,71 @@ class StataEvaluator:
         }
         
         for test in tests:
-            test_result = self._run_single_test(test)
-            results['tests'].append(test_result)
-            results['total_time'] += test_result['response_time']
-            
-            if test_result['passed']:
-                results['passed'] += 1
-                print(f"  ✅ {test['name']}: PASS ({test_result['response_time']:.2f}s)")
-            else:
-                results['failed'] += 1
-                print(f"  ❌ {test['name']}: FAIL ({test_result['response_time']:.2f}s)")
-                print(f"     Missing keywords: {test_result['missing_keywords']}")
-                if test_result['forbidden_found']:
-                    print(f"     Forbidden keywords found: {test_result['forbidden_found']}")
+            _prepare_test(test)
+        
+        if self.max_workers <= 1:
+            # Serial run: report each result as soon as its call completes
+            for test in tests:
+                self._record_result(results, test, self._run_single_test(test))
+        else:
+            # Dispatch every prompt at once; map() keeps results in test order
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(tests))) as executor:
+                for test, test_result in zip(tests, executor.map(self._run_single_test, tests)):
+                    self._record_result(results, test, test_result)
         
         return results
     
+    def _record_result(self, results: Dict, test: Dict, test_result: Dict):
+        """Add one test result to its category and print it"""
+        results['tests'].append(test_result)
+        results['total_time'] += test_result['response_time']
+        
+        if test_result['passed']:
+            results['passed'] += 1
+            self._log.print(f"  ✅ {test['name']}: PASS ({test_result['response_time']:.2f}s)")
+        else:
+            results['failed'] += 1
+            self._log.print(f"  ❌ {test['name']}: FAIL ({test_result['response_time']:.2f}s)")
+            self._log.print(f"     Missing keywords: {test_result['missing_keywords']}")
+            if test_result['forbidden_found']:
+                self._log.print(f"     Forbidden keywords found: {test_result['forbidden_found']}")
+        self._log.flush()
+    
+    def _preview(self, response: str) -> str:
+        """Truncate a response for storage in results"""
+        if len(response) <= self.RESPONSE_PREVIEW_CHARS:
+            return response
+        return response[:self.RESPONSE_PREVIEW_CHARS] + '…'
+    
     def _run_single_test(self, test: Dict) -> Dict:
         """Run a single test case"""
-        start_time = time.time()
+        start_time = time.perf_counter()
         
         try:
             response = self.client.generate(test['prompt'])
-            response_time = time.time() - start_time
+            response_time = time.perf_counter() - start_time
             
-            # Check for expected keywords
             response_lower = response.lower()
-            missing_keywords = [kw for kw in test['expected_keywords'] 
-                              if kw.lower() not in response_lower]
+            if 'automaton' in test:
+                found = {kw_lower for _, kw_lower in test['automaton'].iter(response_lower)}
+            else:
+                found = {kw_lower for _, kw_lower in test['expected_lc'] + test['forbidden_lc']
+                         if kw_lower in response_lower}
+            
+            # Check for expected keywords
+            missing_keywords = [kw for kw, kw_lower in test['expected_lc']
+                              if kw_lower not in found]
             
             # Check for forbidden keywords
-            forbidden_found = [kw for kw in test.get('forbidden_keywords', [])
-                             if kw.lower() in response_lower]
+            forbidden_found = [kw for kw, kw_lower in test['forbidden_lc']
+                             if kw_lower in found]
             
             passed = len(missing_keywords) == 0 and len(forbidden_found) == 0
             
             return {
                 'name': test['name'],
                 'passed': passed,
-                'response': response,
+                'response': response if self.store_responses else self._preview(response),
                 'response_time': response_time,
                 'missing_keywords': missing_keywords,
                 'forbidden_found': forbidden_found,
@@ -270,7 +375,7 @@ class StataEvaluator:
                 'name': test['name'],
                 'passed': False,
                 'response': f"ERROR: {str(e)}",
-                'response_time': time.time() - start_time,
+                'response_time': time.perf_counter() - start_time,
                 'missing_keywords': test['expected_keywords'],
                 'forbidden_found': [],
                 'score': 0.0
@@ -281,36 +386,44 @@ class StataEvaluator:
         pass_rate = (results['passed'] / results['total'] * 100) if results['total'] > 0 else 0
         avg_time = results['total_time'] / results['total'] if results['total'] > 0 else 0
         
-        print(f"\n  Summary: {results['passed']}/{results['total']} passed ({pass_rate:.1f}%)")
-        print(f"  Avg Response Time: {avg_time:.2f}s")
+        self._log.print(f"\n  Summary: {results['passed']}/{results['total']} passed ({pass_rate:.1f}%)")
+        self._log.print(f"  Avg Response Time: {avg_time:.2f}s{self._concurrency_note()}")
+        self._log.flush()
+    
+    def _concurrency_note(self) -> str:
+        """Label response times measured with concurrent requests"""
+        if self.max_workers <= 1:
+            return ""
+        return f" (measured with {self.max_workers} concurrent requests)"
     
     def _print_overall_summary(self, results: Dict):
         """Print overall evaluation summary"""
-        print("\n" + "=" * 70)
-        print("📊 OVERALL EVALUATION SUMMARY")
-        print("=" * 70)
+        self._log.print("\n" + "=" * 70)
+        self._log.print("📊 OVERALL EVALUATION SUMMARY")
+        self._log.print("=" * 70)
         
         pass_rate = (results['total_passed'] / results['total_tests'] * 100) if results['total_tests'] > 0 else 0
         
-        print(f"\nTotal Tests: {results['total_tests']}")
-        print(f"Passed: {results['total_passed']}")
-        print(f"Failed: {results['total_tests'] - results['total_passed']}")
-        print(f"Pass Rate: {pass_rate:.1f}%")
-        print(f"Avg Response Time: {results['avg_response_time']:.2f}s")
+        self._log.print(f"\nTotal Tests: {results['total_tests']}")
+        self._log.print(f"Passed: {results['total_passed']}")
+        self._log.print(f"Failed: {results['total_tests'] - results['total_passed']}")
+        self._log.print(f"Pass Rate: {pass_rate:.1f}%")
+        self._log.print(f"Avg Response Time: {results['avg_response_time']:.2f}s{self._concurrency_note()}")
         
         # Category breakdown
-        print("\n📈 Category Performance:")
+        self._log.print("\n📈 Category Performance:")
         for category, cat_results in results['categories'].items():
             cat_pass_rate = (cat_results['passed'] / cat_results['total'] * 100) if cat_results['total'] > 0 else 0
             bar = "█" * int(cat_pass_rate / 10) + "░" * (10 - int(cat_pass_rate / 10))
-            print(f"  {category:20s} [{bar}] {cat_pass_rate:5.1f}%")
+            self._log.print(f"  {category:20s} [{bar}] {cat_pass_rate:5.1f}%")
         
         # Grade
-        print(f"\n🎓 Overall Grade: {self._get_grade(pass_rate)}")
+        self._log.print(f"\n🎓 Overall Grade: {self._get_grade(pass_rate)}")
         
         # Recommendations
-        print("\n💡 Recommendations:")
+        self._log.print("\n💡 Recommendations:")
         self._print_recommendations(results)
+        self._log.flush()
     
     def _get_grade(self, pass_rate: float) -> str:
         """Get letter grade from pass rate"""
@@ -330,21 +443,29 @@ class StataEvaluator:
                 recommendations.append(f"  ⚠️  Focus on improving {category} (currently {pass_rate:.1f}%)")
         
         if not recommendations:
-            print("  ✨ Performance is good across all categories!")
+            self._log.print("  ✨ Performance is good across all categories!")
         else:
             for rec in recommendations:
-                print(rec)
+                self._log.print(rec)
     
     def save_results(self, filepath: str, results: Dict):
         """Save results to JSON file"""
-        with open(filepath, 'w') as f:
-            json.dump(results, f, indent=2)
+        write_json(filepath, results)
         print(f"\n💾 Results saved to: {filepath}")
 
 
 def main():
     """Run the evaluation suite"""
-    evaluator = StataEvaluator()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dump-responses', action='store_true',
+                        help='Keep full model responses in the results file')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Concurrent prompts per category (response times '
+                             'then include server queueing; default: 1)')
+    args = parser.parse_args()
+    
+    evaluator = StataEvaluator(max_workers=args.workers,
+                               store_responses=args.dump_responses)
     results = evaluator.evaluate_all()
     
     # Save results
@@ -3,12 +3,20 @@ Performance Benchmarks for Stata Editor
 Measures response times and throughput
 """
 
+import argparse
 import sys
 from pathlib import Path
 import time
 import statistics
+from functools import lru_cache, partial
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict
 
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
 sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
 
 from llama_client import LlamaClient
@@ -17,8 +25,46 @@ from llama_client import LlamaClient
 class PerformanceBenchmark:
     """Benchmark the performance of the Stata editor"""
     
-    def __init__(self):
+    LATENCY_QUERIES = [
+        ("Short query", "What is regress?"),
+        ("Medium query", "Explain how to merge two datasets in Stata"),
+        ("Long query", "Explain the difference between fixed effects and random effects models in panel data analysis, and when to use each one in Stata"),
+    ]
+    
+    def __init__(self, cache_responses: bool = False):
         self.client = LlamaClient()
+        # Latency numbers need cold calls, so caching is opt-in (for reruns
+        # where only the responses matter)
+        self.cache_responses = cache_responses
+        self._generate_cached = lru_cache(maxsize=256)(self._generate_uncached)
+        self._encoder = self._load_encoder()
+    
+    @staticmethod
+    def _load_encoder():
+        """Load a BPE encoder for token counts, or None to fall back to estimates"""
+        if tiktoken is None:
+            return None
+        try:
+            return tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            # The encoding file is downloaded on first use and may be unavailable
+            return None
+    
+    def count_tokens(self, text: str) -> float:
+        """Count tokens with the BPE encoder, or estimate from words (words * 1.3)"""
+        if self._encoder is not None:
+            return len(self._encoder.encode(text))
+        return len(text.split()) * 1.3
+    
+    def _generate_uncached(self, prompt: str, max_tokens: int) -> str:
+        """Call the model directly"""
+        return self.client.generate(prompt, max_tokens=max_tokens)
+    
+    def _generate(self, prompt: str, max_tokens: int) -> str:
+        """Generate a response, reusing identical earlier ones if caching is on"""
+        if self.cache_responses:
+            return self._generate_cached(prompt, max_tokens)
+        return self._generate_uncached(prompt, max_tokens)
     
     def run_all_benchmarks(self) -> Dict:
         """Run all performance benchmarks"""
@@ -32,6 +78,10 @@ class PerformanceBenchmark:
             'load': self.benchmark_load_test()
         }
         
+        if self.cache_responses:
+            cache_info = self._generate_cached.cache_info()
+            results['cache'] = {'hits': cache_info.hits, 'misses': cache_info.misses}
+        
         self._print_summary(results)
         return results
     
@@ -40,22 +90,17 @@ class PerformanceBenchmark:
         print("\n📊 Latency Benchmark")
         print("-" * 70)
         
-        queries = [
-            ("Short query", "What is regress?"),
-            ("Medium query", "Explain how to merge two datasets in Stata"),
-            ("Long query", "Explain the difference between fixed effects and random effects models in panel data analysis, and when to use each one in Stata"),
-        ]
-        
         results = {}
         
-        for query_type, query in queries:
+        for query_type, query in self.LATENCY_QUERIES:
             times = []
             print(f"\n  Testing: {query_type}")
             
             for i in range(3):
-                start = time.time()
-                response = self.client.generate(query, max_tokens=200)
-                elapsed = time.time() - start
+                start = time.perf_counter()
+                # Always cold: a cached repeat would time a dict lookup
+                self._generate_uncached(query, max_tokens=200)
+                elapsed = time.perf_counter() - start
                 times.append(elapsed)
                 print(f"    Run {i+1}: {elapsed:.2f}s")
             
@@ -70,6 +115,39 @@ class PerformanceBenchmark:
         
         return results
     
+    def benchmark_latency_pyperf(self) -> None:
+        """
+        Measure latency with pyperf's calibrated, multi-process runner
+        
+        pyperf re-runs this script in worker processes and repeats each query
+        until the timings are statistically stable. Pass pyperf options such
+        as --fast, --rigorous or -o results.json on the command line.
+        """
+        try:
+            import pyperf
+        except ImportError:
+            raise ImportError(
+                "pyperf package is not installed. "
+                "Please run: pip install pyperf"
+            )
+        
+        # Workers are spawned from sys.argv, so they must re-enter this mode
+        runner = pyperf.Runner(
+            add_cmdline_args=lambda cmd, args: cmd.append('--pyperf')
+        )
+        runner.argparser.add_argument('--pyperf', action='store_true',
+                                      help='Benchmark latency with pyperf')
+        # Accepted so main()'s flags parse; latency is never cached anyway
+        runner.argparser.add_argument('--cache-responses', action='store_true',
+                                      help='Ignored: latency runs are uncached')
+        
+        # pyperf collects and reports the timings itself; write them out
+        # with -o, e.g. -o latency.json
+        for query_type, query in self.LATENCY_QUERIES:
+            runner.bench_func(
+                query_type, partial(self.client.generate, query, max_tokens=200)
+            )
+    
     def benchmark_throughput(self) -> Dict:
         """Measure tokens per second"""
         print("\n\n📈 Throughput Benchmark")
@@ -78,17 +156,19 @@ class PerformanceBenchmark:
         query = "Explain how to perform a multiple regression analysis in Stata, including interpretation of results."
         
         print("\n  Generating response and measuring token throughput...")
-        start = time.time()
-        response = self.client.generate(query, max_tokens=500)
-        elapsed = time.time() - start
+        start = time.perf_counter()
+        response = self._generate(query, max_tokens=500)
+        elapsed = time.perf_counter() - start
         
-        # Rough token count (words * 1.3)
-        estimated_tokens = len(response.split()) * 1.3
+        # Only the token count is reported; release the text straight away
+        estimated_tokens = self.count_tokens(response)
+        del response
         tokens_per_second = estimated_tokens / elapsed if elapsed > 0 else 0
         
         results = {
             'total_time': elapsed,
             'estimated_tokens': estimated_tokens,
+            'token_counter': 'tiktoken' if self._encoder is not None else 'word_estimate',
             'tokens_per_second': tokens_per_second
         }
         
@@ -106,29 +186,33 @@ class PerformanceBenchmark:
         query = "Explain Stata's merge command with examples."
         
         print("\n  Testing streaming response...")
-        start = time.time()
-        chunks = []
+        # Integer nanoseconds keep sub-millisecond chunk gaps exact
+        start = time.perf_counter_ns()
+        # Only counts and timings are kept, never the chunk text itself
+        num_chunks = 0
+        total_content_length = 0
         chunk_times = []
         
         first_chunk_time = None
         last_chunk_time = start
         
         for chunk in self.client.stream_generate(query, max_tokens=300):
-            current_time = time.time()
+            current_time = time.perf_counter_ns()
             if first_chunk_time is None:
-                first_chunk_time = current_time - start
-            chunks.append(chunk)
-            chunk_times.append(current_time - last_chunk_time)
+                first_chunk_time = (current_time - start) / 1e9
+            num_chunks += 1
+            total_content_length += len(chunk)
+            chunk_times.append((current_time - last_chunk_time) / 1e9)
             last_chunk_time = current_time
         
-        total_time = time.time() - start
+        total_time = (time.perf_counter_ns() - start) / 1e9
         
         results = {
             'time_to_first_chunk': first_chunk_time,
             'total_time': total_time,
-            'num_chunks': len(chunks),
+            'num_chunks': num_chunks,
             'avg_chunk_time': statistics.mean(chunk_times) if chunk_times else 0,
-            'total_content_length': sum(len(c) for c in chunks)
+            'total_content_length': total_content_length
         }
         
         print(f"\n  Time to First Chunk: {results['time_to_first_chunk']:.3f}s")
@@ -138,34 +222,56 @@ class PerformanceBenchmark:
         
         return results
     
-    def benchmark_load_test(self) -> Dict:
-        """Test performance under load (sequential requests)"""
-        print("\n\n🔥 Load Test (Sequential)")
+    def benchmark_load_test(self, concurrency: int = 5) -> Dict:
+        """Test performance under load (concurrent requests; 1 = sequential)"""
+        mode = "Sequential" if concurrency <= 1 else f"Concurrent x{concurrency}"
+        print(f"\n\n🔥 Load Test ({mode})")
         print("-" * 70)
         
         num_requests = 5
         query = "What does summarize do?"
         
-        print(f"\n  Running {num_requests} requests sequentially...")
-        times = []
+        def timed_generate(_):
+            start = time.perf_counter()
+            self._generate(query, max_tokens=100)
+            return time.perf_counter() - start
+        
+        print(f"\n  Running {num_requests} requests ({mode.lower()})...")
+        if self.cache_responses:
+            print(f"  (cached: 1 miss + {num_requests - 1} hits, not server throughput)")
+        wall_start = time.perf_counter()
+        
+        # lru_cache does not merge calls still in flight, so identical
+        # concurrent prompts would all miss; with caching on, the first
+        # request runs alone (and is timed) so the rest can hit the cache
+        times = [timed_generate(0)] if self.cache_responses else []
+        remaining = range(len(times), num_requests)
+        if concurrency <= 1:
+            times += [timed_generate(i) for i in remaining]
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                times += executor.map(timed_generate, remaining)
+        
+        wall_time = time.perf_counter() - wall_start
         
-        for i in range(num_requests):
-            start = time.time()
-            response = self.client.generate(query, max_tokens=100)
-            elapsed = time.time() - start
-            times.append(elapsed)
+        for i, elapsed in enumerate(times):
             print(f"    Request {i+1}: {elapsed:.2f}s")
         
         results = {
             'num_requests': num_requests,
+            'concurrency': max(1, concurrency),
+            'cached': self.cache_responses,
             'total_time': sum(times),
+            'wall_time': wall_time,
+            'requests_per_second': num_requests / wall_time if wall_time > 0 else 0,
             'avg_time': statistics.mean(times),
             'min_time': min(times),
             'max_time': max(times),
             'std_dev': statistics.stdev(times) if len(times) > 1 else 0
         }
         
-        print(f"\n  Total Time: {results['total_time']:.2f}s")
+        print(f"\n  Wall Time: {results['wall_time']:.2f}s")
+        print(f"  Requests/sec: {results['requests_per_second']:.2f}")
         print(f"  Avg per Request: {results['avg_time']:.2f}s")
         print(f"  Std Dev: {results['std_dev']:.2f}s")
         
@@ -189,10 +295,16 @@ class PerformanceBenchmark:
         print(f"\n🌊 Streaming: {results['streaming']['time_to_first_chunk']:.3f}s to first chunk")
         
         # Load test
-        print(f"\n🔥 Load Test: {results['load']['avg_time']:.2f}s avg per request")
+        cached_note = " (cached responses)" if results['load'].get('cached') else ""
+        print(f"\n🔥 Load Test: {results['load']['avg_time']:.2f}s avg per request, "
+              f"{results['load']['requests_per_second']:.2f} req/s{cached_note}")
+        
+        if 'cache' in results:
+            print(f"\n🗄️  Response Cache: {results['cache']['hits']} hits, "
+                  f"{results['cache']['misses']} misses")
         
         # Performance grade
-        avg_latency = statistics.mean([m['avg'] for m in results['latency'].values()])
+        avg_latency = statistics.fmean(m['avg'] for m in results['latency'].values())
         print(f"\n🎯 Performance Grade: {self._get_performance_grade(avg_latency)}")
     
     def _get_performance_grade(self, avg_latency: float) -> str:
@@ -211,7 +323,23 @@ class PerformanceBenchmark:
 
 def main():
     """Run benchmarks"""
-    benchmark = PerformanceBenchmark()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--pyperf', action='store_true',
+                        help='Benchmark latency with pyperf (other options go to pyperf)')
+    parser.add_argument('--cache-responses', action='store_true',
+                        help='Reuse identical responses (latency stays uncached)')
+    # pyperf parses sys.argv itself, so its options must pass through here
+    args, pyperf_args = parser.parse_known_args()
+    if pyperf_args and not args.pyperf:
+        parser.error(f"unrecognized arguments: {' '.join(pyperf_args)}")
+    
+    benchmark = PerformanceBenchmark(cache_responses=args.cache_responses)
+    
+    # Statistically rigorous latency only; the default run stays a quick smoke test
+    if args.pyperf:
+        benchmark.benchmark_latency_pyperf()
+        return
+    
     results = benchmark.run_all_benchmarks()
 
 
@@ -2,41 +2,57 @@
 Tests for Stata Helper module
 """
 
+import re
+
 import pytest
-import sys
-from pathlib import Path
 
-# Add src to path
-sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
 
-from stata_helper import StataHelper
+@pytest.fixture
+def re_calls(monkeypatch):
+    """Record calls to the re module functions made while a test runs"""
+    calls = []
+    for name in ('compile', 'search', 'match', 'fullmatch', 'findall', 'finditer'):
+        def counting(*args, _name=name, _original=getattr(re, name), **kwargs):
+            calls.append(_name)
+            return _original(*args, **kwargs)
+        monkeypatch.setattr(re, name, counting)
+    return calls
 
 
 class TestStataHelper:
     """Test suite for StataHelper class"""
     
-    def setup_method(self):
-        """Setup test fixtures"""
-        self.helper = StataHelper()
-    
-    def test_initialization(self):
+    def test_initialization(self, helper):
         """Test helper initializes correctly"""
-        assert self.helper is not None
-        assert len(self.helper.common_commands) > 0
-        assert self.helper.stata_context != ""
+        assert helper is not None
+        assert len(helper.common_commands) > 0
+        assert 'regress' in helper.common_commands
+        assert helper.stata_context != ""
     
-    def test_contains_code_detection(self):
-        """Test Stata code detection"""
-        # Should detect Stata code
-        assert self.helper._contains_code("regress y x1 x2")
-        assert self.helper._contains_code("summarize myvar")
-        assert self.helper._contains_code("generate newvar = oldvar * 2")
+    def test_common_commands_coverage(self, helper):
+        """Test that common Stata commands are included"""
+        expected_commands = frozenset(['regress', 'summarize', 'generate', 'merge', 'tabulate'])
         
+        # One set difference against the dict's key view; it also names
+        # every missing command on failure
+        assert not expected_commands - helper.common_commands.keys()
+    
+    @pytest.mark.parametrize("text,expected", [
+        # Should detect Stata code
+        ("regress y x1 x2", True),
+        ("summarize myvar", True),
+        ("generate newvar = oldvar * 2", True),
+        ("foreach var of varlist", True),
         # Should not detect regular text
-        assert not self.helper._contains_code("Hello world")
-        assert not self.helper._contains_code("How do I analyze data?")
+        ("Hello world", False),
+        ("How do I analyze data?", False),
+        ("What is statistics?", False),
+    ])
+    def test_contains_code_detection(self, helper, text, expected):
+        """Test Stata code detection"""
+        assert helper._contains_code(text) is expected
     
-    def test_extract_code_blocks(self):
+    def test_extract_code_blocks(self, helper):
         """Test code block extraction"""
         text = """
 Here is some code:
@@ -45,52 +61,87 @@ regress y x
 ```
 And inline: `summarize var`
         """
-        blocks = self.helper.extract_code_blocks(text)
+        blocks = helper.extract_code_blocks(text)
         assert len(blocks) == 2
         assert "regress y x" in blocks[0]
         assert "summarize var" in blocks[1]
     
-    def test_validate_syntax_balanced_braces(self):
+    @pytest.mark.parametrize("text", [
+        "regress y x1 x2",
+        # A miss runs the whole alternation with no early exit
+        "How do I analyze data?",
+    ])
+    def test_contains_code_uses_precompiled_pattern(self, helper, re_calls, text):
+        """Code detection never compiles or looks up a regex per call"""
+        helper._contains_code(text)
+        assert re_calls == []
+    
+    @pytest.mark.parametrize("text", [
+        "Here is some code:\n```stata\nregress y x\n```\nAnd inline: `summarize var`",
+        "No code in this answer",
+    ])
+    def test_extract_code_blocks_uses_precompiled_pattern(self, helper, re_calls, text):
+        """Code block extraction never compiles or looks up a regex per call"""
+        helper.extract_code_blocks(text)
+        assert re_calls == []
+    
+    def test_validate_syntax_balanced_braces(self, helper):
         """Test syntax validation for balanced braces"""
         valid_code = "foreach var of varlist x1 x2 { \n summarize `var' \n }"
-        is_valid, error = self.helper.validate_syntax(valid_code)
+        is_valid, error = helper.validate_syntax(valid_code)
         assert is_valid
         assert error is None
         
         invalid_code = "foreach var of varlist x1 x2 { \n summarize `var'"
-        is_valid, error = self.helper.validate_syntax(invalid_code)
+        is_valid, error = helper.validate_syntax(invalid_code)
         assert not is_valid
         assert "braces" in error.lower()
     
-    def test_validate_syntax_quotes(self):
+    @pytest.mark.parametrize("code", [
+        "display `\"it's\"'",
+        "display `\"say \"hi\"\"'",
+        "display `\"outer `\"it's\"' `x'\"'",
+    ])
+    def test_validate_syntax_compound_quotes(self, helper, code):
+        """Test compound quotes may contain quotes and apostrophes"""
+        is_valid, error = helper.validate_syntax(code)
+        assert is_valid
+        assert error is None
+    
+    def test_validate_syntax_quotes(self, helper):
         """Test syntax validation for quotes"""
         valid_code = 'display "Hello world"'
-        is_valid, error = self.helper.validate_syntax(valid_code)
+        is_valid, error = helper.validate_syntax(valid_code)
         assert is_valid
         
         invalid_code = 'display "Hello world'
-        is_valid, error = self.helper.validate_syntax(invalid_code)
+        is_valid, error = helper.validate_syntax(invalid_code)
+        assert not is_valid
+        assert "quote" in error.lower()
+    
+    @pytest.mark.parametrize("code", [
+        "display `x",
+        'display "a" `x',
+    ])
+    def test_validate_syntax_unclosed_macro_quote(self, helper, code):
+        """Test an unmatched backtick is caught with or without other quotes"""
+        is_valid, error = helper.validate_syntax(code)
         assert not is_valid
         assert "quote" in error.lower()
     
-    def test_enhance_prompt(self):
+    def test_enhance_prompt(self, helper):
         """Test prompt enhancement"""
         user_prompt = "How do I run a regression?"
-        enhanced = self.helper.enhance_prompt(user_prompt)
+        enhanced = helper.enhance_prompt(user_prompt)
         
         assert user_prompt in enhanced
         assert "Stata" in enhanced
         assert len(enhanced) > len(user_prompt)
     
-    def test_format_code(self):
+    def test_format_code(self, helper):
         """Test code formatting"""
         unformatted = "foreach var in x1 x2 {\nsummarize `var'\n}"
-        formatted = self.helper.format_code(unformatted)
+        formatted = helper.format_code(unformatted)
         
         assert "    summarize" in formatted  # Should be indented
-        lines = formatted.split('\n')
-        assert len(lines) == 3
-
-
-if __name__ == "__main__":
-    pytest.main([__file__, "-v"])
+        assert formatted.count('\n') == 2  # Three lines
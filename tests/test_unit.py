@@ -3,130 +3,96 @@ Unit tests for Stata Editor components
 """
 
 import pytest
-import sys
-from pathlib import Path
+import re
+from concurrent.futures import ThreadPoolExecutor
 
-sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
 
-from llama_client import LlamaClient
-from stata_helper import StataHelper
+# Prompts (and token limits) for the integration flows, keyed by test
+INTEGRATION_PROMPTS = {
+    'stata_question': ("What does the regress command do?", 100),
+    'code_explanation': ("Explain this Stata code: summarize price, detail", 150),
+}
+
+
+# Words the integration replies should mention, matched in one scan each
+# ('regress' also covers 'regression')
+REGRESS_WORDS = re.compile(r'regress|linear')
+SUMMARY_WORDS = re.compile(r'summary|statistics|detail')
+
+
+@pytest.fixture(scope="module")
+def integration_responses(warm_client, helper):
+    """Run every integration prompt at once so Ollama can batch them"""
+    def run(item):
+        name, (prompt, max_tokens) = item
+        enhanced = helper.enhance_prompt(prompt)
+        # Accumulate a stream: tokens arrive as generated instead of
+        # waiting for Ollama to buffer the whole reply
+        return name, ''.join(warm_client.stream_generate(enhanced, max_tokens=max_tokens))
+    
+    with ThreadPoolExecutor(max_workers=len(INTEGRATION_PROMPTS)) as executor:
+        return dict(executor.map(run, INTEGRATION_PROMPTS.items()))
 
 
 class TestLlamaClient:
     """Test LlamaClient functionality"""
     
-    def test_client_initialization(self):
+    def test_client_initialization(self, client):
         """Test that client initializes properly"""
-        client = LlamaClient()
         assert client is not None
         assert client.model_name is not None
         assert client.ollama_host is not None
     
-    def test_basic_generation(self):
+    @pytest.mark.usefixtures('mock_chat')
+    def test_basic_generation(self, client):
         """Test basic text generation"""
-        client = LlamaClient()
         response = client.generate("Say hello", max_tokens=50)
         assert response is not None
         assert len(response) > 0
         assert isinstance(response, str)
     
-    def test_streaming_generation(self):
+    @pytest.mark.usefixtures('mock_chat')
+    def test_streaming_generation(self, client):
         """Test streaming generation"""
-        client = LlamaClient()
-        chunks = list(client.stream_generate("Count to 3", max_tokens=50))
-        assert len(chunks) > 0
-        full_response = ''.join(chunks)
-        assert len(full_response) > 0
+        # Stop at the first non-empty chunk rather than waiting for the
+        # whole reply; that is enough to show streaming works
+        chunk_count = 0
+        total_length = 0
+        for chunk in client.stream_generate("Count to 3", max_tokens=50):
+            chunk_count += 1
+            total_length += len(chunk)
+            if total_length > 0:
+                break
+        assert chunk_count > 0
+        assert total_length > 0
     
-    def test_empty_prompt(self):
+    def test_empty_prompt(self, client):
         """Test handling of empty prompt"""
-        client = LlamaClient()
         response = client.generate("")
         # Should handle gracefully (not crash)
         assert response is not None
-
-
-class TestStataHelper:
-    """Test StataHelper functionality"""
-    
-    def test_helper_initialization(self):
-        """Test helper initializes with common commands"""
-        helper = StataHelper()
-        assert helper is not None
-        assert len(helper.common_commands) > 0
-        assert 'regress' in helper.common_commands
-    
-    def test_contains_code_detection(self):
-        """Test detection of Stata code in text"""
-        helper = StataHelper()
-        
-        # Should detect code
-        assert helper._contains_code("regress y x1 x2")
-        assert helper._contains_code("summarize price")
-        assert helper._contains_code("foreach var of varlist")
-        
-        # Should not detect in plain questions
-        assert not helper._contains_code("What is statistics?")
-        assert not helper._contains_code("Hello world")
-    
-    def test_enhance_prompt(self):
-        """Test prompt enhancement"""
-        helper = StataHelper()
-        
-        original = "Explain regression"
-        enhanced = helper.enhance_prompt(original)
-        
-        assert len(enhanced) > len(original)
-        assert original in enhanced
-        assert 'Stata' in enhanced
-    
-    def test_common_commands_coverage(self):
-        """Test that common Stata commands are included"""
-        helper = StataHelper()
-        expected_commands = ['regress', 'summarize', 'generate', 'merge', 'tabulate']
-        
-        for cmd in expected_commands:
-            assert cmd in helper.common_commands
+        # Blank prompts never reach the model
+        assert response == ""
+        assert list(client.stream_generate("   ")) == []
 
 
 class TestIntegration:
     """Integration tests for the full system"""
     
-    def test_stata_question_flow(self):
+    @pytest.mark.integration
+    def test_stata_question_flow(self, integration_responses):
         """Test full flow of asking a Stata question"""
-        client = LlamaClient()
-        helper = StataHelper()
-        
-        question = "What does the regress command do?"
-        enhanced = helper.enhance_prompt(question)
-        response = client.generate(enhanced, max_tokens=100)
+        response = integration_responses['stata_question']
         
         assert response is not None
         assert len(response) > 0
         # Should mention regression-related concepts
-        response_lower = response.lower()
-        assert any(word in response_lower for word in ['regress', 'regression', 'linear'])
+        assert REGRESS_WORDS.search(response.lower())
     
-    def test_code_explanation_flow(self):
+    @pytest.mark.integration
+    def test_code_explanation_flow(self, integration_responses):
         """Test explaining Stata code"""
-        client = LlamaClient()
-        helper = StataHelper()
-        
-        code = "summarize price, detail"
-        prompt = f"Explain this Stata code: {code}"
-        enhanced = helper.enhance_prompt(prompt)
-        response = client.generate(enhanced, max_tokens=150)
+        response = integration_responses['code_explanation']
         
         assert response is not None
-        response_lower = response.lower()
-        assert any(word in response_lower for word in ['summary', 'statistics', 'detail'])
-
-
-def run_tests():
-    """Run all tests"""
-    print("🧪 Running Unit Tests\n")
-    pytest.main([__file__, '-v'])
-
-
-if __name__ == '__main__':
-    run_tests()
+        assert SUMMARY_WORDS.search(response.lower())